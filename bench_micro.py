@@ -0,0 +1,224 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import threading
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+# Run:  python bench_micro.py                 (compare against bench_baseline.json)
+#       python bench_micro.py --save          (record a new baseline)
+#       python bench_micro.py --app main      (bench main.py instead of main_cache.py)
+# No Postgres needed: endpoint functions get a CannedConnection that replays fixed rows.
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+SEED_SIZE = 58
+DB_ROWS = 500
+REPEAT = 5
+
+
+class CannedCursor:
+    def __init__(self, connection, rows):
+        self.connection = connection
+        self._rows = rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+
+class CannedConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.prepared = set()
+
+    def cursor(self):
+        return CannedCursor(self, self.rows)
+
+
+def fake_docs(n):
+    return [
+        {
+            "key": f"/works/OLBENCH{i}W",
+            "title": f"Python Data Book {i}" if i % 3 else f"Fast Api Press {i}",
+            "author_name": [f"Bench Author {i % 50}"],
+            "publisher": [f"Bench Press {i % 20}"],
+            "first_publish_year": 1950 + i % 70,
+        }
+        for i in range(n)
+    ]
+
+
+def db_rows(n):
+    return [
+        (i + 1, f"Python Book {i}", f"Db Author {i % 40}", f"Db Press {i % 10}", 1990 + i % 30, f"{i}.jpg" if i % 2 else None)
+        for i in range(n)
+    ]
+
+
+def timeit(fn, number):
+    best = None
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        dt = (time.perf_counter() - t0) / number
+        best = dt if best is None or dt < best else best
+    return best * 1e6
+
+
+def bench_ttl_cache(app, results):
+    for entries in (100, 10000):
+        for threads in (1, 4, 8):
+            cache = app.TTLCache(ttl_seconds=60, max_bytes=64 * 1024 * 1024)
+            for i in range(entries):
+                cache.set(("k", i), {"id": i, "title": "t"})
+            ops = 20000
+
+            def worker(offset):
+                for i in range(ops):
+                    key = ("k", (i * 7 + offset) % entries)
+                    if i % 4 == 0:
+                        cache.set(key, {"id": i, "title": "t"})
+                    else:
+                        cache.get(key)
+
+            best = None
+            for _ in range(REPEAT):
+                ts = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+                t0 = time.perf_counter()
+                for t in ts:
+                    t.start()
+                for t in ts:
+                    t.join()
+                dt = (time.perf_counter() - t0) / (ops * threads)
+                best = dt if best is None or dt < best else best
+            results[f"ttl_cache[{entries} entries, {threads} threads]"] = best * 1e6
+
+
+def clear_caches(app, *names):
+    for name in names:
+        if hasattr(app, name):
+            getattr(app, name).clear()
+
+
+def bench_search(app, results):
+    conn = CannedConnection(db_rows(DB_ROWS))
+    args = dict(year_from=None, year_to=None, author=None, publisher=None, skip=0, limit=20, rank=False, live=False, ids=None, fields=None)
+
+    def miss():
+        clear_caches(app, "books_query_cache")
+        app.search_books(q="python", conn=conn, **args)
+
+    def cold():
+        clear_caches(app, "books_query_cache", "row_store")
+        app.search_books(q="python", conn=conn, **args)
+
+    # A projected query returns final values, so the canned rows do too.
+    projected_conn = CannedConnection([(r[0], r[1], app.to_image_url(r[5])) for r in db_rows(DB_ROWS)])
+
+    def projected():
+        clear_caches(app, "books_query_cache")
+        app.search_books(q="python", conn=projected_conn, **{**args, "fields": "title,image_url"})
+
+    def seed_filter():
+        clear_caches(app, "books_query_cache")
+        app.search_books(q=None, conn=CannedConnection([]), **{**args, "year_from": 1960, "publisher": "Bench Press 1"})
+
+    results["search_books[miss]"] = timeit(miss, 50)
+    results["search_books[miss, fields=title,image_url]"] = timeit(projected, 50)
+    results["search_books[seed filters]"] = timeit(seed_filter, 50)
+    if hasattr(app, "row_store"):
+        results["search_books[miss, cold row store]"] = timeit(cold, 50)
+    if hasattr(app, "books_query_cache"):
+        app.search_books(q="python", conn=conn, **args)
+        results["search_books[hit]"] = timeit(lambda: app.search_books(q="python", conn=conn, **args), 2000)
+
+    authors_conn = CannedConnection([(f"Db Author {i}", i) for i in range(40)])
+
+    def authors():
+        clear_caches(app, "authors_query_cache")
+        app.get_authors(q="author", conn=authors_conn)
+
+    results["get_authors[miss]"] = timeit(authors, 100)
+
+
+def bench_rows(app, results):
+    rows = db_rows(DB_ROWS)
+
+    results[f"row_to_book[{DB_ROWS} rows]"] = timeit(lambda: [app.row_to_book(r) for r in rows], 200)
+    if hasattr(app, "row_book"):
+        full = [app.row_to_book(r) for r in rows]
+        tuples = [tuple(b[f] for f in app.BOOK_FIELDS) for b in full]
+        results[f"row_book[{DB_ROWS} rows]"] = timeit(lambda: [app.row_book(t) for t in tuples], 200)
+    results["to_image_url"] = timeit(lambda: app.to_image_url("cover.jpg"), 100000)
+
+
+def bench_serialize(app, results):
+    payload = {"query": "python", "count": 100, "results": app.seed_books[:100], "skip": 0, "limit": 100}
+    results["serialize[json.dumps, 100 books]"] = timeit(lambda: json.dumps(payload), 500)
+    results["serialize[jsonable_encoder, 100 books]"] = timeit(lambda: json.dumps(jsonable_encoder(payload)), 200)
+
+
+def run(app_name):
+    app = importlib.import_module(app_name)
+    app.seed_books = [app.openlibrary_book(b, 999 + i, "OpenLibrary") for i, b in enumerate(fake_docs(SEED_SIZE))]
+    app.seed_by_id = {b["id"]: b for b in app.seed_books}
+    results = {}
+    bench_ttl_cache(app, results)
+    bench_search(app, results)
+    bench_rows(app, results)
+    bench_serialize(app, results)
+    return results
+
+
+def report(results, baseline, threshold):
+    regressions = 0
+    print(f"{'benchmark':<44} {'us/op':>10} {'baseline':>10} {'change':>8}")
+    for name, us in results.items():
+        base = baseline.get(name)
+        if base:
+            change = (us - base) / base * 100
+            flag = "  REGRESSION" if change > threshold else ""
+            regressions += bool(flag)
+            print(f"{name:<44} {us:>10.2f} {base:>10.2f} {change:>+7.1f}%{flag}")
+        else:
+            print(f"{name:<44} {us:>10.2f} {'-':>10} {'-':>8}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app", default="main_cache", choices=["main", "main_cache"])
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--threshold", type=float, default=25.0)
+    args = parser.parse_args()
+
+    results = run(args.app)
+    stored = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            stored = json.load(f)
+    baseline = stored.get(args.app, {}).get("results", {})
+
+    regressions = report(results, baseline, args.threshold)
+    if args.save:
+        stored[args.app] = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+        print(f"baseline saved to {BASELINE_FILE}")
+    elif regressions:
+        raise SystemExit(1)
@@ -0,0 +1,66 @@
+import json
+import psycopg2
+import time
+
+DB_NAME = "books"
+DB_USER = "postgres"
+DB_PASSWORD = "1234"
+DB_HOST = "localhost"
+DB_PORT = "5432"
+
+GET_BOOK_SQL = "SELECT id, title, author, publisher, first_publish_year, image_url FROM books WHERE id=%s"
+GET_BOOK_PREPARED = "SELECT id, title, author, publisher, first_publish_year, image_url FROM books WHERE id=$1"
+
+
+def planning_ms(cur, sql, params):
+    cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return float(plan[0].get("Planning Time") or 0.0)
+
+
+def bench_get_book(n=5000, explain_n=200):
+    conn = psycopg2.connect(
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=DB_HOST,
+        port=DB_PORT,
+    )
+    cur = conn.cursor()
+
+    cur.execute("SELECT id FROM books ORDER BY id LIMIT 1000")
+    ids = [r[0] for r in cur.fetchall()] or [1]
+
+    t0 = time.perf_counter()
+    for i in range(n):
+        cur.execute(GET_BOOK_SQL, (ids[i % len(ids)],))
+        cur.fetchone()
+    plain_s = time.perf_counter() - t0
+
+    cur.execute(f"PREPARE bench_get_book (int) AS {GET_BOOK_PREPARED}")
+    t0 = time.perf_counter()
+    for i in range(n):
+        cur.execute("EXECUTE bench_get_book (%s)", (ids[i % len(ids)],))
+        cur.fetchone()
+    prepared_s = time.perf_counter() - t0
+
+    plain_plan = [planning_ms(cur, GET_BOOK_SQL, (ids[i % len(ids)],)) for i in range(explain_n)]
+    prepared_plan = [planning_ms(cur, "EXECUTE bench_get_book (%s)", (ids[i % len(ids)],)) for i in range(explain_n)]
+
+    conn.rollback()
+    cur.close()
+    conn.close()
+
+    plain_avg = sum(plain_plan) / len(plain_plan)
+    prepared_avg = sum(prepared_plan) / len(prepared_plan)
+
+    print(f"get_book by id, {n} queries")
+    print(f"  plain:    {plain_s * 1000:.1f} ms total, {plain_s / n * 1e6:.1f} us/query, planning {plain_avg:.4f} ms/query")
+    print(f"  prepared: {prepared_s * 1000:.1f} ms total, {prepared_s / n * 1e6:.1f} us/query, planning {prepared_avg:.4f} ms/query")
+    print(f"  saved planning time: {(plain_avg - prepared_avg) * n:.1f} ms per {n} queries")
+
+
+if __name__ == "__main__":
+    bench_get_book()
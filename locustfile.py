@@ -99,6 +99,24 @@ class WebsiteUser(HttpUser):
             else:
                 r.failure(f"Unexpected status: {r.status_code}")
 
+    @task(2)
+    def get_books_batch(self):
+        if not self.known_book_ids:
+            return
+
+        ids = random.sample(self.known_book_ids, min(len(self.known_book_ids), random.choice([5, 20, 50])))
+
+        with self.client.get(
+            "/books",
+            params={"ids": ",".join(str(i) for i in ids)},
+            name="GET /books?ids",
+            catch_response=True
+        ) as r:
+            if r.status_code == 200:
+                r.success()
+            else:
+                r.failure(f"Unexpected status: {r.status_code}")
+
     # -----------------------------
     # WRITE endpoints (کم‌وزن)
     # -----------------------------
@@ -1,11 +1,30 @@
-from fastapi import FastAPI, Query, Form, File, UploadFile, HTTPException, Depends
+from fastapi import FastAPI, Query, Form, File, UploadFile, HTTPException, Depends, Request, Header
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from pydantic import BaseModel, Field
-from typing import Optional, List, Generator, Any, Dict, Tuple
+from array import array
+from collections import OrderedDict, deque
+from typing import Optional, List, Generator, Any, Callable, Dict, Tuple, Iterable, Sequence
+import anyio
+import asyncio
+import bisect
+import functools
+import gc
+import heapq
+import hmac
+import json
+import operator
 import os
+import sys
 import uuid
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+import queue
+import random
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import threading
 
@@ -14,17 +33,86 @@ DB_USER = "postgres"
 DB_PASSWORD = "1234"
 DB_HOST = "localhost"
 DB_PORT = "5432"
+DB_POOL_MIN = 1
+DB_POOL_TIMEOUT = 5.0
 
 IMAGES_DIR = "images"
 MAX_UPLOAD_BYTES = 5 * 1024 * 1024
 ALLOWED_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
 
+OPENLIBRARY_URL = os.getenv("OPENLIBRARY_URL", "https://openlibrary.org/search.json")
+FEDERATION_BUDGET_SECONDS = float(os.getenv("FEDERATION_BUDGET_SECONDS", "0.8"))
+FEDERATION_UPSTREAM_TIMEOUT = 5.0
+FEDERATION_LIMIT = 20
+FEDERATION_WORKERS = 8
+FEDERATION_MAX_PENDING = 32
+
+SEED_PRELOAD = os.getenv("SEED_PRELOAD", "0") == "1"
+SEED_REFRESH = os.getenv("SEED_REFRESH", "0") == "1"
+SEED_CATALOG_PATH = os.getenv("SEED_CATALOG_PATH", "/dev/shm/books-seed-catalog.json")
+SEED_MAX_AGE_SECONDS = float(os.getenv("SEED_MAX_AGE_SECONDS", "3600"))
+SEED_POLL_SECONDS = 5.0
+SEED_RETRY_SECONDS = float(os.getenv("SEED_RETRY_SECONDS", "60"))
+
+ID_FILTER_SETTLE_SECONDS = 5.0
+ID_FILTER_RELOAD_SECONDS = 60.0
+ID_CEILING_REFRESH_SECONDS = 5.0
+ID_CEILING_TTL_SECONDS = 15.0
+SUGGEST_REBUILD_SECONDS = 30.0
+
+MAX_LOOKUP_IDS = 300
+
+WRITE_BATCHING = os.getenv("WRITE_BATCHING", "0") == "1"
+WRITE_BATCH_MAX_ITEMS = 64
+WRITE_BATCH_MAX_DELAY = 0.005
+WRITE_BATCH_MAX_QUEUE = 1000
+WRITE_BATCH_RESULT_TIMEOUT = 10.0
+
+PROFILER_ADMIN_TOKEN = os.getenv("PROFILER_ADMIN_TOKEN", "")
+PROFILE_MAX_STACKS = 20000
+
+BACKGROUND_TASKS = os.getenv("BACKGROUND_TASKS", "0") == "1"
+TASK_JOURNAL_PATH = os.getenv("TASK_JOURNAL_PATH", "tasks.journal")
+TASK_WORKERS = 2
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_BASE_DELAY = 0.5
+TASK_JOURNAL_COMPACT_EVERY = 1000
+# Journal writes are flushed to the OS on every entry; set TASK_JOURNAL_FSYNC=1 to
+# also fsync them so queued tasks survive a host crash, not just a process crash.
+TASK_JOURNAL_FSYNC = os.getenv("TASK_JOURNAL_FSYNC", "0") == "1"
+ORPHAN_IMAGE_GRACE_SECONDS = 3600
+
+ADMISSION_LIMITS = {
+    "search": {"max_concurrent": 10, "max_queue": 48, "queue_timeout": 1.0, "retry_after": 2},
+    "lookup": {"max_concurrent": 16, "max_queue": 200, "queue_timeout": 0.5, "retry_after": 1},
+    "write": {"max_concurrent": 6, "max_queue": 32, "queue_timeout": 2.0, "retry_after": 2},
+}
+DB_POOL_BACKGROUND_SLOTS = 8
+DB_POOL_MAX = sum(g["max_concurrent"] for g in ADMISSION_LIMITS.values()) + DB_POOL_BACKGROUND_SLOTS
+if WRITE_BATCHING:
+    # Batched writes wait on the batcher's single connection, not the pool, so the gate
+    # has to let a full batch through for group commit to ever fill one.
+    ADMISSION_LIMITS["write"] = {
+        "max_concurrent": WRITE_BATCH_MAX_ITEMS,
+        "max_queue": WRITE_BATCH_MAX_QUEUE - WRITE_BATCH_MAX_ITEMS,
+        "queue_timeout": 2.0,
+        "retry_after": 2,
+    }
+THREADPOOL_SIZE = max(40, sum(g["max_concurrent"] for g in ADMISSION_LIMITS.values()) + DB_POOL_BACKGROUND_SLOTS)
+
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
 app = FastAPI()
 app.mount("/images", StaticFiles(directory=IMAGES_DIR), name="images")
 
 seed_books: List[dict] = []
+seed_by_id: Dict[int, dict] = {}
+seed_generation = 0
+seed_fetched_at = 0.0
+seed_stamp: Optional[Tuple[int, int]] = None
+seed_retry_at = 0.0
+seed_refresh_stop = threading.Event()
+seed_refresh_thread: Optional[threading.Thread] = None
 
 class BookIn(BaseModel):
     title: str = Field(..., min_length=3, max_length=100)
@@ -37,6 +125,240 @@ class BookOut(BookIn):
     image_url: Optional[str] = None
     source: str
 
+RANK_FIELD_WEIGHTS = {"title": 3.0, "author": 2.0, "publisher": 1.0, "first_publish_year": 1.5}
+RANK_EXACT = 3
+RANK_PREFIX = 2
+RANK_SUBSTRING = 1
+RANK_RECENCY_WEIGHT = 1.0
+RANK_RECENCY_BASE_YEAR = 1900
+RANK_RECENCY_SPAN = 150
+
+def match_score(value: str, term: str) -> int:
+    if value == term:
+        return RANK_EXACT
+    if value.startswith(term):
+        return RANK_PREFIX
+    if term in value:
+        return RANK_SUBSTRING
+    return 0
+
+def recency_bonus(year: int) -> float:
+    age = min(max((year or 0) - RANK_RECENCY_BASE_YEAR, 0), RANK_RECENCY_SPAN)
+    return RANK_RECENCY_WEIGHT * age / RANK_RECENCY_SPAN
+
+def rank_score(book: dict, term: str) -> float:
+    score = 0.0
+    for field, weight in RANK_FIELD_WEIGHTS.items():
+        score += weight * match_score(str(book.get(field) or "").lower(), term)
+    if score <= 0:
+        return 0.0
+    return round(score + recency_bonus(book.get("first_publish_year") or 0), 4)
+
+def rank_score_sql() -> str:
+    exprs = {
+        "title": "LOWER(title)",
+        "author": "LOWER(author)",
+        "publisher": "LOWER(publisher)",
+        "first_publish_year": "CAST(first_publish_year AS TEXT)",
+    }
+    parts = []
+    for field, weight in RANK_FIELD_WEIGHTS.items():
+        e = exprs[field]
+        parts.append(
+            f"CASE WHEN {e} = $1 THEN {weight * RANK_EXACT} "
+            f"WHEN {e} LIKE $1 || '%' THEN {weight * RANK_PREFIX} "
+            f"WHEN {e} LIKE '%' || $1 || '%' THEN {weight * RANK_SUBSTRING} "
+            f"ELSE 0 END"
+        )
+    recency = (
+        f"{RANK_RECENCY_WEIGHT} * LEAST(GREATEST(first_publish_year - {RANK_RECENCY_BASE_YEAR}, 0), {RANK_RECENCY_SPAN})"
+        f" / {float(RANK_RECENCY_SPAN)}"
+    )
+    return "ROUND((" + " + ".join(parts) + " + " + recency + ")::numeric, 4)"
+
+PREPARED_SQL = {
+    "book_by_id": (
+        "(int)",
+        "SELECT id, title, author, publisher, first_publish_year, image_url FROM books WHERE id=$1",
+    ),
+    "books_by_ids": (
+        "(int[])",
+        "SELECT id, title, author, publisher, first_publish_year, image_url FROM books WHERE id = ANY($1)",
+    ),
+    "authors_search": (
+        "(text)",
+        """
+        SELECT author, COUNT(*) AS book_count
+        FROM books
+        WHERE LOWER(author) LIKE $1
+        GROUP BY author
+        """,
+    ),
+    "book_for_update": (
+        "(int)",
+        "SELECT image_url, title, author FROM books WHERE id=$1",
+    ),
+    "book_insert": (
+        "(text, text, text, int, text)",
+        """
+        INSERT INTO books (title, author, publisher, first_publish_year, image_url)
+        VALUES ($1, $2, $3, $4, $5)
+        RETURNING id
+        """,
+    ),
+    "book_update": (
+        "(text, text, text, int, text, int)",
+        """
+        UPDATE books
+        SET title=$1, author=$2, publisher=$3, first_publish_year=$4, image_url=$5
+        WHERE id=$6
+        RETURNING id
+        """,
+    ),
+    "book_delete": (
+        "(int)",
+        "DELETE FROM books WHERE id=$1 RETURNING image_url, title, author",
+    ),
+}
+
+BOOK_FILTERS = [
+    ("year_from", "int", "first_publish_year", ">="),
+    ("year_to", "int", "first_publish_year", "<="),
+    ("author", "text", "author", "="),
+    ("publisher", "text", "publisher", "="),
+]
+FILTER_OPS = {">=": operator.ge, "<=": operator.le, "=": operator.eq}
+BOOK_COLUMNS = ("id", "title", "author", "publisher", "first_publish_year", "image_url")
+BOOK_FIELDS = BOOK_COLUMNS + ("source",)
+
+TEXT_MATCH_SQL = (
+    "(LOWER(title) LIKE '%' || $1 || '%' OR LOWER(author) LIKE '%' || $1 || '%'"
+    " OR LOWER(publisher) LIKE '%' || $1 || '%' OR CAST(first_publish_year AS TEXT) LIKE '%' || $1 || '%')"
+)
+# Projected queries return values in their final form (see to_image_url), so a row zips
+# straight onto the requested field names.
+PROJECTED_FIELD_SQL = {
+    "image_url": "CASE WHEN image_url <> '' THEN '/images/' || image_url END",
+    "source": "'Database'",
+}
+
+def search_statement(
+    ranked: bool, ql: Optional[str], filters: Dict[str, Any], k: int = 0, fields: Optional[Tuple[str, ...]] = None
+) -> Tuple[str, tuple]:
+    active = [f for f in BOOK_FILTERS if filters.get(f[0]) is not None]
+    name = ("books_ranked" if ranked else "books_search") + ("" if ql else "_all")
+    name += "".join(f"_{f[0]}" for f in active)
+    if not ranked and fields:
+        name += f"_p{sum(1 << i for i, f in enumerate(BOOK_FIELDS) if f in fields)}"
+    types, conds, params = [], [], []
+    if ql:
+        types.append("text")
+        conds.append(TEXT_MATCH_SQL)
+        params.append(ql)
+    for key, typ, column, op in active:
+        types.append(typ)
+        params.append(filters[key])
+        conds.append(f"{column} {op} ${len(params)}")
+    if ranked:
+        types.append("int")
+        params.append(k)
+    if name not in PREPARED_SQL:
+        where = " AND ".join(conds)
+        if ranked:
+            sql = f"""
+            SELECT ranked.id, ranked.title, ranked.author, ranked.publisher, ranked.first_publish_year, ranked.image_url, ranked.score, total.n
+            FROM (
+                SELECT id, title, author, publisher, first_publish_year, image_url, {rank_score_sql()} AS score
+                FROM books
+                WHERE {where}
+                ORDER BY score DESC, id
+                LIMIT ${len(params)}
+            ) ranked
+            CROSS JOIN (SELECT COUNT(*) AS n FROM books WHERE {where}) total
+            ORDER BY ranked.score DESC, ranked.id
+            """
+        else:
+            sql = f"""
+            SELECT {", ".join(PROJECTED_FIELD_SQL.get(f, f) for f in fields) if fields else ", ".join(BOOK_COLUMNS)}
+            FROM books
+            WHERE {where}
+            ORDER BY id
+            """
+        PREPARED_SQL[name] = ("(" + ", ".join(types) + ")", sql)
+    return name, tuple(params)
+
+def seed_matches(b: dict, ql: Optional[str], filters: Dict[str, Any]) -> bool:
+    if ql and not (
+        ql in (b["title"] or "").lower()
+        or ql in (b["author"] or "").lower()
+        or ql in (b["publisher"] or "").lower()
+        or ql in str(b["first_publish_year"])
+    ):
+        return False
+    for key, _, column, op in BOOK_FILTERS:
+        value = filters.get(key)
+        if value is not None and not FILTER_OPS[op](b[column], value):
+            return False
+    return True
+
+def parse_fields(raw: Optional[str]) -> Optional[Tuple[str, ...]]:
+    if raw is None:
+        return None
+    wanted = {f.strip() for f in raw.split(",") if f.strip()}
+    unknown = wanted - set(BOOK_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    wanted.add("id")
+    return tuple(f for f in BOOK_FIELDS if f in wanted)
+
+def project_book(b: dict, fields: Tuple[str, ...]) -> dict:
+    out = {f: b.get(f) for f in fields}
+    if "score" in b:
+        out["score"] = b["score"]
+    return out
+
+def row_to_book(r: tuple) -> dict:
+    return {
+        "id": r[0],
+        "title": r[1],
+        "author": r[2],
+        "publisher": r[3],
+        "first_publish_year": r[4],
+        "image_url": to_image_url(r[5]),
+        "source": "Database",
+    }
+
+class PreparedConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+class BlockingConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    def __init__(self, minconn: int, maxconn: int, *args, timeout: float, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        # psycopg2 closes every returned connection beyond minconn; keep up to maxconn
+        # idle instead so each connection's prepared statements outlive the request.
+        self.minconn = maxconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self.timeout = float(timeout)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.pool.PoolError("connection pool exhausted")
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+db_pool: Optional[BlockingConnectionPool] = None
+
 def db_connect():
     return psycopg2.connect(
         dbname=DB_NAME,
@@ -44,14 +366,53 @@ def db_connect():
         password=DB_PASSWORD,
         host=DB_HOST,
         port=DB_PORT,
+        connection_factory=PreparedConnection,
     )
 
+def open_db_pool():
+    global db_pool
+    if db_pool is None:
+        db_pool = BlockingConnectionPool(
+            DB_POOL_MIN,
+            DB_POOL_MAX,
+            timeout=DB_POOL_TIMEOUT,
+            dbname=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            host=DB_HOST,
+            port=DB_PORT,
+            connection_factory=PreparedConnection,
+        )
+
+def close_db_pool():
+    global db_pool
+    if db_pool is not None:
+        db_pool.closeall()
+        db_pool = None
+
 def get_db() -> Generator:
-    conn = db_connect()
+    try:
+        conn = db_pool.getconn()
+    except psycopg2.pool.PoolError:
+        raise HTTPException(status_code=503, detail="Database is busy", headers={"Retry-After": "1"})
     try:
         yield conn
     finally:
-        conn.close()
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        db_pool.putconn(conn, close=bool(conn.closed))
+
+def execute_prepared(cursor, name: str, params: tuple):
+    conn = cursor.connection
+    if name not in conn.prepared:
+        types, sql = PREPARED_SQL[name]
+        cursor.execute(f"PREPARE {name} {types} AS {sql}")
+        conn.prepared.add(name)
+    placeholders = ", ".join(["%s"] * len(params))
+    cursor.execute(f"EXECUTE {name} ({placeholders})", params)
 
 def safe_ext(filename: str) -> str:
     _, ext = os.path.splitext(filename or "")
@@ -82,95 +443,1373 @@ def save_upload(image: UploadFile) -> str:
             f.write(chunk)
     return name
 
+def delete_image_file(filename: str) -> None:
+    path = os.path.join(IMAGES_DIR, filename)
+    if os.path.isfile(path):
+        os.remove(path)
+
 def remove_image(filename: Optional[str]) -> None:
     if not filename:
         return
-    path = os.path.join(IMAGES_DIR, filename)
-    if os.path.isfile(path):
-        try:
-            os.remove(path)
-        except Exception:
-            pass
+    task_queue.submit("remove_image", filename)
 
 def to_image_url(filename: Optional[str]) -> Optional[str]:
     return f"/images/{filename}" if filename else None
 
-def load_seed():
-    global seed_books
-    url = "https://openlibrary.org/search.json"
+def openlibrary_book(b: dict, book_id: Optional[int], source: str) -> dict:
+    return {
+        "id": book_id,
+        "title": b.get("title") or "Unknown",
+        "author": (b.get("author_name") or ["Unknown"])[0] if isinstance(b.get("author_name"), list) else "Unknown",
+        "publisher": (b.get("publisher") or ["Unknown"])[0] if isinstance(b.get("publisher"), list) else "Unknown",
+        "first_publish_year": int(b.get("first_publish_year") or 0),
+        "image_url": None,
+        "source": source,
+    }
+
+def fetch_seed() -> Optional[List[dict]]:
     params = {"q": "python", "limit": 58}
     try:
-        r = requests.get(url, params=params, timeout=10)
+        r = requests.get(OPENLIBRARY_URL, params=params, timeout=10)
         r.raise_for_status()
         data = r.json()
     except Exception:
-        seed_books = []
-        return
-    out = []
+        return None
     docs = data.get("docs") or []
-    for i, b in enumerate(docs):
-        out.append(
-            {
-                "id": 999 + i,
-                "title": b.get("title") or "Unknown",
-                "author": (b.get("author_name") or ["Unknown"])[0] if isinstance(b.get("author_name"), list) else "Unknown",
-                "publisher": (b.get("publisher") or ["Unknown"])[0] if isinstance(b.get("publisher"), list) else "Unknown",
-                "first_publish_year": int(b.get("first_publish_year") or 0),
-                "image_url": None,
-                "source": "OpenLibrary",
-            }
-        )
-    seed_books = out
+    return [openlibrary_book(b, 999 + i, "OpenLibrary") for i, b in enumerate(docs)]
+
+def valid_seed_catalog(catalog: Any) -> bool:
+    return (
+        isinstance(catalog, dict)
+        and isinstance(catalog.get("generation"), int)
+        and isinstance(catalog.get("fetched_at"), (int, float))
+        and isinstance(catalog.get("books"), list)
+        and all(isinstance(b, dict) and set(b) == set(BOOK_FIELDS) and isinstance(b["id"], int) for b in catalog["books"])
+    )
+
+def read_seed_catalog() -> Optional[dict]:
+    try:
+        with open(SEED_CATALOG_PATH, encoding="utf-8") as f:
+            st = os.fstat(f.fileno())
+            if st.st_uid != os.getuid() or st.st_mode & 0o002:
+                return None
+            catalog = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not valid_seed_catalog(catalog):
+        return None
+    catalog["stamp"] = (st.st_ino, st.st_mtime_ns)
+    return catalog
+
+def publish_seed_catalog(catalog: dict):
+    tmp = f"{SEED_CATALOG_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(catalog, f)
+    os.replace(tmp, SEED_CATALOG_PATH)
+
+def refresh_seed_catalog() -> Optional[dict]:
+    import fcntl
+    global seed_retry_at
+    if time.time() < seed_retry_at:
+        return None
+    try:
+        lock = open(SEED_CATALOG_PATH + ".lock", "a+")
+    except OSError:
+        books = fetch_seed()
+        if not books:
+            seed_retry_at = time.time() + SEED_RETRY_SECONDS
+            return None
+        return {"generation": seed_generation + 1, "fetched_at": time.time(), "books": books}
+    with lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        latest = read_seed_catalog()
+        if latest is not None and time.time() - latest["fetched_at"] <= SEED_MAX_AGE_SECONDS:
+            return latest
+        # The lock file holds the time of the last failed fetch, so one outage
+        # costs one upstream call per SEED_RETRY_SECONDS across all workers.
+        lock.seek(0)
+        try:
+            failed_at = float(lock.read() or 0)
+        except ValueError:
+            failed_at = 0.0
+        if time.time() - failed_at < SEED_RETRY_SECONDS:
+            seed_retry_at = failed_at + SEED_RETRY_SECONDS
+            return latest
+        books = fetch_seed()
+        lock.truncate(0)
+        if books is None:
+            seed_retry_at = time.time() + SEED_RETRY_SECONDS
+            lock.write(repr(time.time()))
+            lock.flush()
+            return latest
+        catalog = {
+            "generation": max(seed_generation, latest["generation"] if latest else 0) + 1,
+            "fetched_at": time.time(),
+            "books": books,
+        }
+        try:
+            publish_seed_catalog(catalog)
+            st = os.stat(SEED_CATALOG_PATH)
+            catalog["stamp"] = (st.st_ino, st.st_mtime_ns)
+        except OSError:
+            pass
+        return catalog
+
+def install_seed(catalog: dict) -> List[dict]:
+    global seed_books, seed_by_id, seed_generation, seed_fetched_at, seed_stamp
+    old = seed_books
+    books = catalog["books"]
+    seed_by_id = {b["id"]: b for b in books}
+    seed_books = books
+    seed_generation = catalog["generation"]
+    seed_fetched_at = catalog["fetched_at"]
+    seed_stamp = catalog.get("stamp")
+    return old
+
+def load_seed():
+    if not (SEED_PRELOAD or SEED_REFRESH):
+        install_seed({"generation": seed_generation + 1, "fetched_at": time.time(), "books": fetch_seed() or []})
+        return
+    catalog = read_seed_catalog()
+    if catalog is None or time.time() - catalog["fetched_at"] > SEED_MAX_AGE_SECONDS:
+        catalog = refresh_seed_catalog()
+    if catalog is not None:
+        install_seed(catalog)
+
+class PrefixIndex:
+    # Keys are bucketed by count and each bucket is sorted, so a lookup walks the buckets
+    # from the highest count down and stops after k matches instead of ranking all of them.
+    def __init__(self):
+        self._buckets: Dict[int, List[Tuple[str, str]]] = {}
+        self._levels: List[int] = []
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def rebuild(self, texts: Iterable[str]):
+        counts: Dict[str, int] = {}
+        for t in texts:
+            t = (t or "").strip()
+            if t:
+                counts[t] = counts.get(t, 0) + 1
+        buckets: Dict[int, List[Tuple[str, str]]] = {}
+        for t, n in counts.items():
+            buckets.setdefault(n, []).append((t.lower(), t))
+        for keys in buckets.values():
+            keys.sort()
+        with self._lock:
+            self._buckets = buckets
+            self._levels = sorted(buckets, reverse=True)
+            self._counts = counts
+
+    def _move(self, entry: Tuple[str, str], old: int, new: int):
+        if old:
+            keys = self._buckets[old]
+            del keys[bisect.bisect_left(keys, entry)]
+            if not keys:
+                del self._buckets[old]
+                self._levels.remove(old)
+        if new:
+            keys = self._buckets.get(new)
+            if keys is None:
+                keys = self._buckets[new] = []
+                self._levels.append(new)
+                self._levels.sort(reverse=True)
+            bisect.insort(keys, entry)
+
+    def add(self, text: str):
+        text = (text or "").strip()
+        if not text:
+            return
+        with self._lock:
+            n = self._counts.get(text, 0)
+            self._move((text.lower(), text), n, n + 1)
+            self._counts[text] = n + 1
+
+    def remove(self, text: str):
+        text = (text or "").strip()
+        with self._lock:
+            n = self._counts.get(text, 0)
+            if n == 0:
+                return
+            self._move((text.lower(), text), n, n - 1)
+            if n > 1:
+                self._counts[text] = n - 1
+            else:
+                del self._counts[text]
+
+    def suggest(self, prefix: str, k: int) -> List[Tuple[str, int]]:
+        p = prefix.lower()
+        end = (p + "\U0010ffff",)
+        out: List[Tuple[str, int]] = []
+        with self._lock:
+            for n in self._levels:
+                keys = self._buckets[n]
+                lo = bisect.bisect_left(keys, (p,))
+                hi = min(bisect.bisect_left(keys, end, lo), lo + k - len(out))
+                out += [(text, n) for _, text in keys[lo:hi]]
+                if len(out) >= k:
+                    break
+        return out
+
+title_index = PrefixIndex()
+author_index = PrefixIndex()
+suggest_rebuild_stop = threading.Event()
+suggest_rebuild_thread: Optional[threading.Thread] = None
+
+def build_suggest_index():
+    conn = db_pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT title, author FROM books")
+            rows = cursor.fetchall()
+        conn.rollback()
+    finally:
+        db_pool.putconn(conn)
+    rows += [(b["title"], b["author"]) for b in seed_books]
+    title_index.rebuild(r[0] for r in rows)
+    author_index.rebuild(r[1] for r in rows)
+
+def suggest_rebuild_loop():
+    while not suggest_rebuild_stop.wait(SUGGEST_REBUILD_SECONDS):
+        try:
+            build_suggest_index()
+        except Exception:
+            pass
+
+def start_suggest_rebuild():
+    global suggest_rebuild_thread
+    suggest_rebuild_stop.clear()
+    suggest_rebuild_thread = threading.Thread(target=suggest_rebuild_loop, name="suggest-rebuild", daemon=True)
+    suggest_rebuild_thread.start()
+
+def stop_suggest_rebuild():
+    suggest_rebuild_stop.set()
+    if suggest_rebuild_thread is not None:
+        suggest_rebuild_thread.join(timeout=5)
+
+def suggest_index_add(title: str, author: str):
+    title_index.add(title)
+    author_index.add(author)
+
+def suggest_index_remove(title: str, author: str):
+    title_index.remove(title)
+    author_index.remove(author)
+
+CACHE_ENTRY_OVERHEAD = 256
+
+def row_size(row: tuple) -> int:
+    return sys.getsizeof(row) + sum(map(sys.getsizeof, row))
+
+def rows_size(rows: Sequence[tuple]) -> int:
+    # Rows in one result share a shape, so the first one stands in for the rest.
+    return sys.getsizeof(rows) + (len(rows) * row_size(rows[0]) if rows else 0)
+
+def approx_size(obj: Any) -> int:
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(approx_size(x) for x in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(approx_size(k) + approx_size(v) for k, v in obj.items())
+    return sys.getsizeof(obj)
 
 class TTLCache:
-    def __init__(self, ttl_seconds: int, max_items: int):
+    def __init__(self, ttl_seconds: int, max_bytes: int):
         self.ttl = int(ttl_seconds)
-        self.max_items = int(max_items)
-        self._data: Dict[Any, Tuple[float, Any]] = {}
+        self.max_bytes = int(max_bytes)
+        self._data: "OrderedDict[Any, Tuple[float, Any, float, int]]" = OrderedDict()
         self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
     def get(self, key: Any):
         now = time.time()
         with self._lock:
             item = self._data.get(key)
             if not item:
+                self.misses += 1
                 return None
-            ts, val = item
-            if now - ts > self.ttl:
-                self._data.pop(key, None)
+            ts, val, ttl, size = item
+            if now - ts > ttl:
+                del self._data[key]
+                self.bytes -= size
+                self.misses += 1
                 return None
+            self.hits += 1
             return val
 
-    def set(self, key: Any, value: Any):
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None, size: Optional[int] = None):
+        if size is None:
+            size = approx_size(key) + approx_size(value)
+        if size > self.max_bytes:
+            self.delete(key)
+            return
         now = time.time()
         with self._lock:
-            if len(self._data) >= self.max_items:
-                oldest_key = None
-                oldest_ts = None
-                for k, (ts, _) in self._data.items():
-                    if oldest_ts is None or ts < oldest_ts:
-                        oldest_ts = ts
-                        oldest_key = k
-                if oldest_key is not None:
-                    self._data.pop(oldest_key, None)
-            self._data[key] = (now, value)
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[3]
+            while self._data and self.bytes + size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.bytes -= evicted[3]
+                self.evictions += 1
+            self._data[key] = (now, value, self.ttl if ttl is None else ttl, size)
+            self.bytes += size
 
     def delete(self, key: Any):
         with self._lock:
-            self._data.pop(key, None)
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= old[3]
+
+    def clear(self) -> "OrderedDict[Any, Tuple[float, Any, float, int]]":
+        with self._lock:
+            old, self._data = self._data, OrderedDict()
+            self.bytes = 0
+        return old
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+books_query_cache = TTLCache(ttl_seconds=20, max_bytes=16 * 1024 * 1024)
+book_by_id_cache = TTLCache(ttl_seconds=60, max_bytes=8 * 1024 * 1024)
+authors_query_cache = TTLCache(ttl_seconds=30, max_bytes=4 * 1024 * 1024)
+ROW_STORE_MAX_BYTES = 64 * 1024 * 1024
+
+book_tuple = operator.itemgetter(*BOOK_FIELDS)
+
+def row_book(row: tuple) -> dict:
+    return dict(zip(BOOK_FIELDS, row))
+
+class RowStore:
+    # Rows are kept in LRU order; once over budget the least recently used ones are dropped,
+    # and a cached key list that points at a dropped row reads as a miss for that query only.
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self._rows: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+
+    def put_many(self, rows: List[tuple]) -> array:
+        keys = array("q", [r[0] if r[6] == "Database" else -r[0] for r in rows])
+        with self._lock:
+            stored = self._rows
+            for key, row in zip(keys, rows):
+                old = stored.get(key)
+                if old is not None:
+                    stored.move_to_end(key)
+                    if old == row:
+                        continue
+                    self.bytes -= row_size(old)
+                stored[key] = row
+                self.bytes += row_size(row)
+            while self.bytes > self.max_bytes and len(stored) > len(keys):
+                _, old = stored.popitem(last=False)
+                self.bytes -= row_size(old)
+                self.evictions += 1
+        return keys
+
+    def books(self, keys: Iterable[int]) -> Optional[List[dict]]:
+        out = []
+        with self._lock:
+            for k in keys:
+                row = self._rows.get(k)
+                if row is None:
+                    return None
+                self._rows.move_to_end(k)
+                out.append(row_book(row))
+        return out
+
+    def clear(self) -> "OrderedDict[int, tuple]":
+        with self._lock:
+            old, self._rows = self._rows, OrderedDict()
+            self.bytes = 0
+        return old
 
-    def clear(self):
+    def stats(self) -> dict:
         with self._lock:
-            self._data.clear()
+            return {
+                "rows": len(self._rows),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
 
-books_query_cache = TTLCache(ttl_seconds=20, max_items=500)
-book_by_id_cache = TTLCache(ttl_seconds=60, max_items=2000)
-authors_query_cache = TTLCache(ttl_seconds=30, max_items=500)
+row_store = RowStore(ROW_STORE_MAX_BYTES)
 
 def invalidate_all_reads():
-    books_query_cache.clear()
-    authors_query_cache.clear()
-    book_by_id_cache.clear()
+    dropped = [books_query_cache.clear(), authors_query_cache.clear(), book_by_id_cache.clear(), row_store.clear()]
+    task_queue.submit("release_cached", dropped, durable=False)
+
+def release_cached(dropped: List[dict]):
+    for d in dropped:
+        d.clear()
+
+def store_rows(rows: List[tuple]) -> array:
+    return row_store.put_many(rows)
+
+BOOK_MISSING = object()
+NEGATIVE_CACHE_TTL = 5
+NEGATIVE_CACHE_MAX = 1000
+negative_book_keys: deque = deque()
+negative_book_lock = threading.Lock()
+
+def cache_missing_book(cache_key: Any):
+    if not existing_ids.is_settled(cache_key[1]):
+        return
+    with negative_book_lock:
+        if len(negative_book_keys) >= NEGATIVE_CACHE_MAX:
+            old_key = negative_book_keys.popleft()
+            if book_by_id_cache.get(old_key) is BOOK_MISSING:
+                book_by_id_cache.delete(old_key)
+        negative_book_keys.append(cache_key)
+    book_by_id_cache.set(cache_key, BOOK_MISSING, ttl=NEGATIVE_CACHE_TTL, size=CACHE_ENTRY_OVERHEAD)
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = int(failure_threshold)
+        self.reset_seconds = float(reset_seconds)
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+upstream_session = requests.Session()
+upstream_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=FEDERATION_WORKERS))
+upstream_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=FEDERATION_WORKERS))
+upstream_executor = ThreadPoolExecutor(max_workers=FEDERATION_WORKERS, thread_name_prefix="openlibrary")
+upstream_breaker = CircuitBreaker(failure_threshold=5, reset_seconds=30)
+upstream_cache = TTLCache(ttl_seconds=300, max_bytes=8 * 1024 * 1024)
+upstream_inflight: Dict[str, Future] = {}
+upstream_lock = threading.Lock()
+
+def fetch_openlibrary(term: str) -> Tuple[str, List[dict]]:
+    cached = upstream_cache.get(term)
+    if cached is not None:
+        return "cached", cached
+    if not upstream_breaker.allow():
+        return "circuit_open", []
+    try:
+        r = upstream_session.get(
+            OPENLIBRARY_URL,
+            params={"q": term, "limit": FEDERATION_LIMIT},
+            timeout=FEDERATION_UPSTREAM_TIMEOUT,
+        )
+        r.raise_for_status()
+        docs = r.json().get("docs") or []
+    except Exception:
+        upstream_breaker.record_failure()
+        return "error", []
+    upstream_breaker.record_success()
+    out = [openlibrary_book(b, None, "OpenLibraryLive") for b in docs if isinstance(b, dict)]
+    upstream_cache.set(term, out)
+    return "ok", out
+
+def submit_live(term: str) -> Future:
+    cached = upstream_cache.get(term)
+    if cached is not None:
+        fut: Future = Future()
+        fut.set_result(("cached", cached))
+        return fut
+    with upstream_lock:
+        fut = upstream_inflight.get(term)
+        if fut is not None:
+            return fut
+        if len(upstream_inflight) >= FEDERATION_MAX_PENDING:
+            fut = Future()
+            fut.set_result(("saturated", []))
+            return fut
+        fut = upstream_executor.submit(fetch_openlibrary, term)
+        upstream_inflight[term] = fut
+
+    def done(f: Future):
+        with upstream_lock:
+            if upstream_inflight.get(term) is f:
+                del upstream_inflight[term]
+    fut.add_done_callback(done)
+    return fut
+
+def collect_live(future: Optional[Future], deadline: float) -> Tuple[List[dict], dict]:
+    if future is None:
+        return [], {"status": "disabled", "count": 0}
+    try:
+        status, results = future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeout:
+        return [], {"status": "timeout", "count": 0}
+    except Exception:
+        return [], {"status": "error", "count": 0}
+    return results, {"status": status, "count": len(results)}
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Dict[int, str] = {}
+        self._stacks: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.running = False
+        self.sample_rate = 0.0
+        self.route: Optional[str] = None
+        self.handlers: Optional[frozenset] = None
+        self.interval = 0.01
+        self.started_at: Optional[float] = None
+        self.ends_at = 0.0
+        self.samples = 0
+        self.dropped = 0
+        self.sampled_requests = 0
+
+    def should_sample(self, route: str) -> bool:
+        if not self.running:
+            return False
+        if self.handlers is not None and route not in self.handlers:
+            return False
+        return random.random() < self.sample_rate
+
+    def enter(self, tid: int, route: str):
+        with self._lock:
+            self._active[tid] = route
+            self.sampled_requests += 1
+
+    def exit(self, tid: int):
+        with self._lock:
+            self._active.pop(tid, None)
+
+    def start(
+        self, duration: float, sample_rate: float, route: Optional[str], handlers: Optional[frozenset], interval: float
+    ):
+        with self._lock:
+            if self.running:
+                raise HTTPException(status_code=409, detail="A profiling session is already running")
+            self._stacks = {}
+            self._active = {}
+            self.samples = 0
+            self.dropped = 0
+            self.sampled_requests = 0
+            self.sample_rate = float(sample_rate)
+            self.route = route
+            self.handlers = handlers
+            self.interval = float(interval)
+            self.started_at = time.time()
+            self.ends_at = time.monotonic() + float(duration)
+            self.running = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval) and time.monotonic() < self.ends_at:
+                self._sample()
+        finally:
+            with self._lock:
+                self.running = False
+                self._active.clear()
+
+    def _sample(self):
+        with self._lock:
+            active = list(self._active.items())
+        if not active:
+            return
+        frames = sys._current_frames()
+        for tid, route in active:
+            frame = frames.get(tid)
+            if frame is None:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            parts.append(route)
+            stack = ";".join(reversed(parts))
+            with self._lock:
+                self.samples += 1
+                if stack in self._stacks or len(self._stacks) < PROFILE_MAX_STACKS:
+                    self._stacks[stack] = self._stacks.get(stack, 0) + 1
+                else:
+                    self.dropped += 1
+
+    def folded(self) -> str:
+        with self._lock:
+            return "".join(f"{stack} {n}\n" for stack, n in sorted(self._stacks.items()))
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "route": self.route,
+                "sample_rate": self.sample_rate,
+                "interval_ms": round(self.interval * 1000, 3),
+                "started_at": self.started_at,
+                "seconds_left": round(max(0.0, self.ends_at - time.monotonic()), 3) if self.running else 0.0,
+                "sampled_requests": self.sampled_requests,
+                "samples": self.samples,
+                "distinct_stacks": len(self._stacks),
+                "dropped_samples": self.dropped,
+            }
+
+profiler = SamplingProfiler()
+PROFILED_HANDLERS = set()
+
+def profiled(fn):
+    route = fn.__name__
+    PROFILED_HANDLERS.add(route)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not profiler.should_sample(route):
+            return fn(*args, **kwargs)
+        tid = threading.get_ident()
+        profiler.enter(tid, route)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.exit(tid)
+    return wrapper
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not PROFILER_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, PROFILER_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+class AdmissionGate:
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.name = name
+        self.max_concurrent = int(max_concurrent)
+        self.max_queue = int(max_queue)
+        self.queue_timeout = float(queue_timeout)
+        self.retry_after = int(retry_after)
+        self._sem = asyncio.Semaphore(self.max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> bool:
+        if not self._sem.locked():
+            await self._sem.acquire()
+        elif self.waiting >= self.max_queue:
+            self.shed += 1
+            return False
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                self.shed += 1
+                return False
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._sem.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+        }
+
+admission_gates = {name: AdmissionGate(name, **cfg) for name, cfg in ADMISSION_LIMITS.items()}
+
+def admission_gate_for(method: str, path: str) -> Optional[AdmissionGate]:
+    if method == "GET":
+        if path in ("/books", "/authors"):
+            return admission_gates["search"]
+        if path.startswith("/books/"):
+            return admission_gates["lookup"]
+        return None
+    if path == "/books" or path.startswith("/books/"):
+        return admission_gates["write"]
+    return None
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    gate = admission_gate_for(request.method, request.url.path)
+    if gate is None:
+        return await call_next(request)
+    if not await gate.acquire():
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server is overloaded, retry later"},
+            headers={"Retry-After": str(gate.retry_after)},
+        )
+    try:
+        return await call_next(request)
+    finally:
+        gate.release()
+
+@app.get("/metrics/admission")
+async def admission_metrics():
+    return {name: gate.stats() for name, gate in admission_gates.items()}
+
+@app.get("/metrics/writes")
+async def write_metrics():
+    return write_batcher.stats()
+
+@app.get("/metrics/tasks")
+async def task_metrics():
+    return task_queue.stats()
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    return {
+        "books_query_cache": books_query_cache.stats(),
+        "book_by_id_cache": book_by_id_cache.stats(),
+        "authors_query_cache": authors_query_cache.stats(),
+        "upstream_cache": upstream_cache.stats(),
+        "row_store": row_store.stats(),
+    }
+
+def resolve_profile_route(route: str) -> frozenset:
+    if route in PROFILED_HANDLERS:
+        return frozenset([route])
+    profiled_routes = [r for r in app.routes if getattr(getattr(r, "endpoint", None), "__name__", None) in PROFILED_HANDLERS]
+    names = frozenset(r.endpoint.__name__ for r in profiled_routes if r.path == route)
+    if not names:
+        paths = ", ".join(sorted({r.path for r in profiled_routes}))
+        raise HTTPException(status_code=400, detail=f"Unknown route {route!r}; profiled routes are: {paths}")
+    return names
+
+@app.post("/admin/profile/start", dependencies=[Depends(require_admin)])
+def profile_start(
+    duration: float = Query(30, gt=0, le=600),
+    sample_rate: float = Query(0.1, gt=0, le=1),
+    route: Optional[str] = Query(None, min_length=1, max_length=100),
+    interval_ms: float = Query(10, ge=1, le=1000),
+):
+    handlers = resolve_profile_route(route) if route is not None else None
+    profiler.start(duration, sample_rate, route, handlers, interval_ms / 1000.0)
+    return profiler.status()
+
+@app.post("/admin/profile/stop", dependencies=[Depends(require_admin)])
+def profile_stop():
+    profiler.stop()
+    return profiler.status()
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+def profile_status():
+    return profiler.status()
+
+@app.get("/admin/profile/stacks", dependencies=[Depends(require_admin)])
+def profile_stacks():
+    return PlainTextResponse(profiler.folded())
+
+class IdFilter:
+    def __init__(self):
+        self._bits = bytearray()
+        self._lock = threading.Lock()
+        self._recent: Dict[int, float] = {}
+        self._last_seq = 0
+        self.trusted_max = 0
+        self.ceiling = 0
+        self.ceiling_at: Optional[float] = None
+        self.ready = False
+        self.answered = 0
+
+    def load(self, ids: Iterable[int], seq_value: int, started_at: float):
+        bits = bytearray(seq_value // 8 + 1)
+        for i in ids:
+            if 0 < i <= seq_value:
+                bits[i >> 3] |= 1 << (i & 7)
+        with self._lock:
+            for i in self._recent:
+                if i <= seq_value:
+                    bits[i >> 3] |= 1 << (i & 7)
+            self._recent = {i: ts for i, ts in self._recent.items() if ts >= started_at}
+            self._bits = bits
+            self.trusted_max = self._last_seq
+            self._last_seq = seq_value
+            self.ready = self.trusted_max > 0
+
+    def set_ceiling(self, seq_value: int, started_at: float):
+        with self._lock:
+            local = [i for i, ts in self._recent.items() if ts >= started_at]
+            self.ceiling = max([seq_value, *local])
+            self.ceiling_at = time.monotonic()
+
+    def add(self, book_id: int):
+        with self._lock:
+            self._recent[book_id] = time.monotonic()
+            if book_id > self.ceiling:
+                self.ceiling = book_id
+            if 0 < book_id < len(self._bits) * 8:
+                self._bits[book_id >> 3] |= 1 << (book_id & 7)
+
+    def discard(self, book_id: int):
+        with self._lock:
+            self._recent.pop(book_id, None)
+            if 0 < book_id < len(self._bits) * 8:
+                self._bits[book_id >> 3] &= ~(1 << (book_id & 7)) & 0xFF
+
+    def is_settled(self, book_id: int) -> bool:
+        return book_id <= self.trusted_max
+
+    def definitely_missing(self, book_id: int) -> bool:
+        if book_id <= 0:
+            missing = True
+        elif book_id > self.ceiling:
+            # Ids above the sequence have never been handed out; the ceiling is at most
+            # ID_CEILING_TTL_SECONDS behind other workers' inserts, and exact for ours.
+            at = self.ceiling_at
+            if at is None or time.monotonic() - at > ID_CEILING_TTL_SECONDS:
+                return False
+            missing = True
+        elif not self.ready or book_id > self.trusted_max:
+            return False
+        else:
+            missing = not (self._bits[book_id >> 3] >> (book_id & 7)) & 1
+        if missing:
+            self.answered += 1
+        return missing
+
+existing_ids = IdFilter()
+id_filter_stop = threading.Event()
+id_filter_thread: Optional[threading.Thread] = None
+
+ID_SEQ_SQL = "SELECT COALESCE(pg_sequence_last_value(pg_get_serial_sequence('books', 'id')), 0)"
+
+def refresh_id_ceiling(cursor) -> int:
+    started_at = time.monotonic()
+    cursor.execute(ID_SEQ_SQL)
+    seq_value = int(cursor.fetchone()[0])
+    existing_ids.set_ceiling(seq_value, started_at)
+    return seq_value
+
+def reload_id_filter(cursor):
+    started_at = time.monotonic()
+    seq_value = refresh_id_ceiling(cursor)
+    cursor.execute("SELECT id FROM books")
+    existing_ids.load((r[0] for r in cursor.fetchall()), seq_value, started_at)
+
+def id_filter_loop():
+    reload_at = time.monotonic() + ID_FILTER_SETTLE_SECONDS
+    while True:
+        conn = None
+        try:
+            conn = db_pool.getconn()
+            with conn.cursor() as cursor:
+                if time.monotonic() >= reload_at:
+                    reload_id_filter(cursor)
+                    reload_at = time.monotonic() + ID_FILTER_RELOAD_SECONDS
+                else:
+                    refresh_id_ceiling(cursor)
+            conn.rollback()
+        except Exception:
+            pass
+        finally:
+            if conn is not None:
+                db_pool.putconn(conn, close=bool(conn.closed))
+        if id_filter_stop.wait(ID_CEILING_REFRESH_SECONDS):
+            return
+
+def start_id_filter():
+    global id_filter_thread
+    conn = db_pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            reload_id_filter(cursor)
+        conn.rollback()
+    finally:
+        db_pool.putconn(conn)
+    id_filter_stop.clear()
+    id_filter_thread = threading.Thread(target=id_filter_loop, name="id-filter", daemon=True)
+    id_filter_thread.start()
+
+def stop_id_filter():
+    id_filter_stop.set()
+    if id_filter_thread is not None:
+        id_filter_thread.join(timeout=5)
+
+def insert_book_row(cursor, title: str, author: str, publisher: str, first_publish_year: int, image_name: Optional[str]) -> int:
+    execute_prepared(
+        cursor,
+        "book_insert",
+        (title, author, publisher, first_publish_year, image_name),
+    )
+    return cursor.fetchone()[0]
+
+def update_book_row(cursor, book_id: int, title: str, author: str, publisher: str, first_publish_year: int, image_name: Optional[str]):
+    execute_prepared(cursor, "book_for_update", (book_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    execute_prepared(
+        cursor,
+        "book_update",
+        (title, author, publisher, first_publish_year, image_name or row[0], book_id),
+    )
+    cursor.fetchone()
+    return row
+
+def delete_book_row(cursor, book_id: int):
+    execute_prepared(cursor, "book_delete", (book_id,))
+    return cursor.fetchone()
+
+class WriteBatcher:
+    def __init__(self, max_items: int, max_delay: float, max_queue: int):
+        self.max_items = int(max_items)
+        self.max_delay = float(max_delay)
+        self._queue: "queue.Queue[Tuple[Callable[[Any], Any], Future]]" = queue.Queue(maxsize=int(max_queue))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.items = 0
+        self.failed_batches = 0
+        self.largest_batch = 0
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="write-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def submit(self, fn: Callable[[Any], Any]) -> Future:
+        fut: Future = Future()
+        try:
+            self._queue.put_nowait((fn, fut))
+        except queue.Full:
+            raise HTTPException(status_code=503, detail="Write queue is full", headers={"Retry-After": "1"})
+        return fut
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            try:
+                batch = [self._queue.get(timeout=0.2)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._flush(batch)
+            except Exception as e:
+                self.failed_batches += 1
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+    def _flush(self, batch: List[Tuple[Callable[[Any], Any], Future]]):
+        batch = [(fn, fut) for fn, fut in batch if fut.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        outcomes = []
+        conn = None
+        try:
+            conn = db_pool.getconn()
+            with conn.cursor() as cursor:
+                for fn, fut in batch:
+                    cursor.execute("SAVEPOINT batch_item")
+                    try:
+                        outcomes.append((fut, fn(cursor), None))
+                        cursor.execute("RELEASE SAVEPOINT batch_item")
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT batch_item")
+                        outcomes.append((fut, None, e))
+            conn.commit()
+        except Exception as e:
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            self.failed_batches += 1
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        finally:
+            if conn is not None:
+                db_pool.putconn(conn, close=bool(conn.closed))
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for fut, result, error in outcomes:
+            if error is None:
+                fut.set_result(result)
+            else:
+                fut.set_exception(error)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": WRITE_BATCHING,
+            "queue_depth": self._queue.qsize(),
+            "batches": self.batches,
+            "items": self.items,
+            "failed_batches": self.failed_batches,
+            "largest_batch": self.largest_batch,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
+
+write_batcher = WriteBatcher(WRITE_BATCH_MAX_ITEMS, WRITE_BATCH_MAX_DELAY, WRITE_BATCH_MAX_QUEUE)
+
+class WriteOutcomeUnknown(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=504, detail="Write is still in progress; check before retrying")
+
+def run_batched(fn: Callable[[Any], Any]):
+    fut = write_batcher.submit(fn)
+    try:
+        return fut.result(timeout=WRITE_BATCH_RESULT_TIMEOUT)
+    except FutureTimeout:
+        if fut.cancel():
+            raise HTTPException(status_code=504, detail="Write did not complete in time")
+    try:
+        return fut.result(timeout=WRITE_BATCH_RESULT_TIMEOUT)
+    except FutureTimeout:
+        raise WriteOutcomeUnknown()
+
+def get_write_db() -> Generator:
+    if WRITE_BATCHING:
+        yield None
+        return
+    yield from get_db()
+
+class TaskQueue:
+    def __init__(
+        self,
+        journal_path: str,
+        workers: int,
+        max_attempts: int,
+        retry_base_delay: float,
+        compact_every: int,
+        fsync: bool,
+    ):
+        self.journal_path = journal_path
+        self.workers = int(workers)
+        self.max_attempts = int(max_attempts)
+        self.retry_base_delay = float(retry_base_delay)
+        self.compact_every = int(compact_every)
+        self.fsync = fsync
+        self._handlers: Dict[str, Callable[..., None]] = {}
+        self._heap: List[Tuple[float, int, dict]] = []
+        self._cond = threading.Condition()
+        self._journal_lock = threading.Lock()
+        self._journal = None
+        self._journal_file = journal_path
+        self._live: Dict[str, dict] = {}
+        self._settled = 0
+        self._threads: List[threading.Thread] = []
+        self._seq = 0
+        self._stopping = False
+        self.running = False
+        self.submitted = 0
+        self.completed = 0
+        self.retried = 0
+        self.dead = 0
+        self.replayed = 0
+        self.compactions = 0
+
+    def register(self, name: str, fn: Callable[..., None]):
+        self._handlers[name] = fn
+
+    def start(self):
+        self._journal = self._claim_journal()
+        pending = self._replay(self._journal.read().splitlines())
+        with self._journal_lock:
+            self._live = {task["id"]: {"op": "add", **task} for task in pending}
+            self._compact()
+        self._stopping = False
+        self.running = True
+        now = time.monotonic()
+        for task in pending:
+            task["durable"] = True
+            self._push(now, task)
+        self.replayed = len(pending)
+        self._threads = [
+            threading.Thread(target=self._run, name=f"task-worker-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=5)
+        self.running = False
+        with self._journal_lock:
+            self._journal.close()
+            self._journal = None
+
+    def submit(self, name: str, *args, durable: bool = True):
+        if not self.running:
+            try:
+                self._handlers[name](*args)
+            except Exception:
+                pass
+            return
+        task = {"id": uuid.uuid4().hex, "task": name, "args": list(args), "attempt": 0}
+        if durable:
+            self._write({"op": "add", **task})
+        task["durable"] = durable
+        self.submitted += 1
+        self._push(time.monotonic(), task)
+
+    def _push(self, due: float, task: dict):
+        with self._cond:
+            self._seq += 1
+            heapq.heappush(self._heap, (due, self._seq, task))
+            self._cond.notify()
+
+    def _write(self, entry: dict):
+        with self._journal_lock:
+            if self._journal is None:
+                return
+            self._append(self._journal, entry)
+            if entry["op"] == "add":
+                self._live[entry["id"]] = entry
+                return
+            self._live.pop(entry["id"], None)
+            self._settled += 1
+            if self._settled >= self.compact_every:
+                self._compact()
+
+    def _append(self, f, entry: dict):
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def _compact(self):
+        import fcntl
+        # Rewrite the journal with only the unfinished adds. The new file is locked
+        # before it replaces the old one; _claim_journal checks for a replaced inode.
+        tmp = open(f"{self._journal_file}.{os.getpid()}.tmp", "w", encoding="utf-8")
+        fcntl.flock(tmp, fcntl.LOCK_EX)
+        for entry in self._live.values():
+            tmp.write(json.dumps(entry) + "\n")
+        tmp.flush()
+        if self.fsync:
+            os.fsync(tmp.fileno())
+        os.replace(tmp.name, self._journal_file)
+        self._journal.close()
+        self._journal = tmp
+        self._settled = 0
+        self.compactions += 1
+
+    def _claim_journal(self):
+        import fcntl
+        slot = 0
+        while True:
+            path = self.journal_path if slot == 0 else f"{self.journal_path}.{slot}"
+            f = open(path, "a+", encoding="utf-8")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                slot += 1
+                continue
+            try:
+                current = os.stat(path).st_ino == os.fstat(f.fileno()).st_ino
+            except OSError:
+                current = False
+            if not current:
+                # Another worker compacted this slot between our open and flock; the
+                # inode we locked is no longer the journal, so look at the path again.
+                f.close()
+                continue
+            f.seek(0)
+            self._journal_file = path
+            return f
+
+    def _replay(self, lines: List[str]) -> List[dict]:
+        pending: Dict[str, dict] = {}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            op = entry.pop("op", None)
+            if op == "add":
+                pending[entry["id"]] = entry
+            else:
+                pending.pop(entry.get("id"), None)
+        return [t for t in pending.values() if t.get("task") in self._handlers]
+
+    def _next(self) -> Optional[dict]:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    return heapq.heappop(self._heap)[2]
+                if self._stopping:
+                    return None
+                self._cond.wait(timeout=self._heap[0][0] - now if self._heap else None)
+
+    def _run(self):
+        while True:
+            task = self._next()
+            if task is None:
+                return
+            try:
+                self._handlers[task["task"]](*task["args"])
+            except Exception as e:
+                task["attempt"] += 1
+                if task["attempt"] >= self.max_attempts:
+                    self.dead += 1
+                    if task["durable"]:
+                        self._write({"op": "dead", "id": task["id"], "error": repr(e)})
+                    continue
+                self.retried += 1
+                self._push(time.monotonic() + self.retry_base_delay * 2 ** (task["attempt"] - 1), task)
+                continue
+            self.completed += 1
+            if task["durable"]:
+                self._write({"op": "done", "id": task["id"]})
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = len(self._heap)
+        return {
+            "enabled": BACKGROUND_TASKS,
+            "running": self.running,
+            "pending": pending,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "retried": self.retried,
+            "dead": self.dead,
+            "replayed": self.replayed,
+            "journal_entries": len(self._live),
+            "compactions": self.compactions,
+        }
+
+task_queue = TaskQueue(
+    TASK_JOURNAL_PATH,
+    TASK_WORKERS,
+    TASK_MAX_ATTEMPTS,
+    TASK_RETRY_BASE_DELAY,
+    TASK_JOURNAL_COMPACT_EVERY,
+    TASK_JOURNAL_FSYNC,
+)
+
+def sweep_orphan_images():
+    conn = db_pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT image_url FROM books WHERE image_url IS NOT NULL")
+            referenced = {r[0] for r in cursor.fetchall()}
+        conn.rollback()
+    finally:
+        db_pool.putconn(conn, close=bool(conn.closed))
+    cutoff = time.time() - ORPHAN_IMAGE_GRACE_SECONDS
+    for entry in os.scandir(IMAGES_DIR):
+        if entry.is_file() and entry.name not in referenced and entry.stat().st_mtime < cutoff:
+            task_queue.submit("remove_image", entry.name)
+
+task_queue.register("remove_image", delete_image_file)
+task_queue.register("sweep_orphan_images", sweep_orphan_images)
+task_queue.register("release_cached", release_cached)
+
+def swap_seed(catalog: dict):
+    old = install_seed(catalog)
+    for b in old:
+        suggest_index_remove(b["title"], b["author"])
+    for b in seed_books:
+        suggest_index_add(b["title"], b["author"])
+    invalidate_all_reads()
+
+def seed_refresh_loop():
+    global seed_stamp
+    while not seed_refresh_stop.wait(SEED_POLL_SECONDS):
+        try:
+            st = os.stat(SEED_CATALOG_PATH)
+            stamp = (st.st_ino, st.st_mtime_ns)
+        except OSError:
+            stamp = None
+        catalog = read_seed_catalog() if stamp is not None and stamp != seed_stamp else None
+        if catalog is None and time.time() - seed_fetched_at > SEED_MAX_AGE_SECONDS:
+            catalog = refresh_seed_catalog()
+        if catalog is not None and catalog["generation"] > seed_generation:
+            swap_seed(catalog)
+        elif stamp is not None:
+            seed_stamp = stamp
+
+def start_seed_refresh():
+    global seed_refresh_thread
+    seed_refresh_stop.clear()
+    seed_refresh_thread = threading.Thread(target=seed_refresh_loop, name="seed-refresh", daemon=True)
+    seed_refresh_thread.start()
+
+def stop_seed_refresh():
+    seed_refresh_stop.set()
+    if seed_refresh_thread is not None:
+        seed_refresh_thread.join(timeout=5)
+
+@app.get("/metrics/seed")
+async def seed_metrics():
+    return {
+        "generation": seed_generation,
+        "books": len(seed_books),
+        "age_seconds": round(time.time() - seed_fetched_at, 1) if seed_fetched_at else None,
+        "preloaded": SEED_PRELOAD,
+        "catalog_path": SEED_CATALOG_PATH,
+    }
+
+@app.on_event("startup")
+async def size_threadpool():
+    # Admitted requests each hold a worker thread while they run; make room for all of them.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
 
 @app.on_event("startup")
 def startup():
@@ -189,115 +1828,305 @@ def startup():
                 );
                 """
             )
+            cursor.execute("CREATE INDEX IF NOT EXISTS books_year_id_idx ON books (first_publish_year, id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS books_author_year_idx ON books (author, first_publish_year)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS books_publisher_year_idx ON books (publisher, first_publish_year)")
         conn.commit()
     finally:
         conn.close()
-    load_seed()
+    open_db_pool()
+    if not (SEED_PRELOAD and seed_generation):
+        load_seed()
+    build_suggest_index()
+    start_suggest_rebuild()
+    if SEED_REFRESH:
+        start_seed_refresh()
+    start_id_filter()
+    if WRITE_BATCHING:
+        write_batcher.start()
+    if BACKGROUND_TASKS:
+        task_queue.start()
+        task_queue.submit("sweep_orphan_images", durable=False)
+
+@app.on_event("shutdown")
+def shutdown():
+    write_batcher.stop()
+    stop_id_filter()
+    stop_suggest_rebuild()
+    stop_seed_refresh()
+    task_queue.stop()
+    close_db_pool()
+
+def ranked_matches(conn, ql: str, filters: Dict[str, Any], k: int) -> Tuple[int, List[dict]]:
+    name, params = search_statement(True, ql, filters, k)
+    try:
+        with conn.cursor() as cursor:
+            execute_prepared(cursor, name, params)
+            rows = cursor.fetchall()
+    except Exception:
+        raise HTTPException(status_code=500, detail="Database query failed")
+    db_total = rows[0][7] if rows else 0
+    db_results = [
+        {
+            "id": r[0],
+            "title": r[1],
+            "author": r[2],
+            "publisher": r[3],
+            "first_publish_year": r[4],
+            "image_url": to_image_url(r[5]),
+            "source": "Database",
+            "score": float(r[6]),
+        }
+        for r in rows
+    ]
+    ext_results = []
+    for b in seed_books:
+        if not seed_matches(b, None, filters):
+            continue
+        score = rank_score(b, ql)
+        if score > 0:
+            ext_results.append({**b, "score": score})
+    top = heapq.nlargest(k, db_results + ext_results, key=lambda x: (x["score"], -x["id"]))
+    return db_total + len(ext_results), top
+
+def parse_book_ids(raw: str) -> List[int]:
+    out = []
+    for part in raw.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            out.append(int(part))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    out = list(dict.fromkeys(out))
+    if not out:
+        raise HTTPException(status_code=400, detail="ids must not be empty")
+    if len(out) > MAX_LOOKUP_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LOOKUP_IDS} ids per request")
+    return out
+
+def fetch_books_by_ids(conn, ids: List[int]) -> Dict[int, dict]:
+    if not ids:
+        return {}
+    try:
+        with conn.cursor() as cursor:
+            execute_prepared(cursor, "books_by_ids", (ids,))
+            rows = cursor.fetchall()
+    except Exception:
+        raise HTTPException(status_code=500, detail="Database query failed")
+    return {r[0]: row_to_book(r) for r in rows}
+
+def lookup_books(conn, ids: List[int]) -> dict:
+    found: Dict[int, dict] = {}
+    misses = []
+    for i in ids:
+        cached = book_by_id_cache.get(("book", i))
+        if cached is BOOK_MISSING:
+            continue
+        if cached is not None:
+            found[i] = row_book(cached)
+        elif not existing_ids.definitely_missing(i):
+            misses.append(i)
+    fetched = fetch_books_by_ids(conn, misses)
+    for i, b in fetched.items():
+        row = book_tuple(b)
+        book_by_id_cache.set(("book", i), row, size=row_size(row) + CACHE_ENTRY_OVERHEAD)
+    found.update(fetched)
+    results, missing = [], []
+    for i in ids:
+        b = found.get(i)
+        if b is None:
+            b = seed_by_id.get(i)
+            if b is not None:
+                row = book_tuple(b)
+                book_by_id_cache.set(("book", i), row, size=row_size(row) + CACHE_ENTRY_OVERHEAD)
+        if b is None:
+            missing.append(i)
+            if i in misses:
+                cache_missing_book(("book", i))
+        else:
+            results.append(b)
+    return {"ids": ids, "count": len(results), "results": results, "missing": missing}
 
 @app.get("/books")
+@profiled
 def search_books(
-    q: str = Query(..., min_length=1, max_length=100),
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
+    year_from: Optional[int] = Query(None, ge=0),
+    year_to: Optional[int] = Query(None, ge=0),
+    author: Optional[str] = Query(None, min_length=1, max_length=100),
+    publisher: Optional[str] = Query(None, min_length=1, max_length=100),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    rank: bool = Query(False),
+    live: bool = Query(False),
+    ids: Optional[str] = Query(None, min_length=1, max_length=4000),
+    fields: Optional[str] = Query(None, min_length=1, max_length=200),
     conn=Depends(get_db),
 ):
-    ql = q.lower()
-    cache_key = ("books", ql)
+    projection = parse_fields(fields)
+    if ids is not None:
+        out = lookup_books(conn, parse_book_ids(ids))
+        if projection:
+            out["results"] = [project_book(b, projection) for b in out["results"]]
+        return out
+    ql = q.lower() if q else None
+    filters = {"year_from": year_from, "year_to": year_to, "author": author, "publisher": publisher}
+    if not ql and all(v is None for v in filters.values()):
+        raise HTTPException(status_code=400, detail="Provide q or at least one filter")
+    filter_key = tuple(filters[f[0]] for f in BOOK_FILTERS)
+    end = skip + limit
+    if rank:
+        if not ql:
+            raise HTTPException(status_code=400, detail="Ranked search requires q")
+        cache_key = ("books_ranked", ql, filter_key, end)
+        cached = books_query_cache.get(cache_key)
+        page = None
+        if cached is not None:
+            keys, scores, total = cached
+            page = row_store.books(keys[skip:end])
+            if page is not None:
+                for b, score in zip(page, scores[skip:end]):
+                    b["score"] = score
+        if page is None:
+            total, top = ranked_matches(conn, ql, filters, end)
+            keys = store_rows([book_tuple(b) for b in top])
+            scores = array("d", (b["score"] for b in top))
+            size = sys.getsizeof(keys) + sys.getsizeof(scores) + CACHE_ENTRY_OVERHEAD
+            books_query_cache.set(cache_key, (keys, scores, total), size=size)
+            page = top[skip:end]
+        if projection:
+            page = [project_book(b, projection) for b in page]
+        return {"query": q, "count": total, "results": page, "skip": skip, "limit": limit}
+    deadline = time.monotonic() + FEDERATION_BUDGET_SECONDS
+    live_future = submit_live(ql) if live and ql else None
+    if projection:
+        page, n = projected_search(conn, ql, filters, filter_key, projection, skip, end)
+    else:
+        page, n = full_search(conn, ql, filters, filter_key, skip, end)
+    live_results, live_info = collect_live(live_future, deadline)
+    live_page = live_results[max(0, skip - n):max(0, end - n)]
+    if projection:
+        live_page = [project_book(b, projection) for b in live_page]
+    out = {"query": q, "count": n + len(live_results), "results": page + live_page, "skip": skip, "limit": limit}
+    if live:
+        out["live"] = live_info
+    return out
+
+def full_search(
+    conn, ql: Optional[str], filters: Dict[str, Any], filter_key: tuple, skip: int, end: int
+) -> Tuple[List[dict], int]:
+    cache_key = ("books", ql, filter_key, None)
+    keys = books_query_cache.get(cache_key)
+    page = row_store.books(keys[skip:end]) if keys is not None else None
+    if page is None:
+        name, params = search_statement(False, ql, filters)
+        try:
+            with conn.cursor() as cursor:
+                execute_prepared(cursor, name, params)
+                rows = cursor.fetchall()
+        except Exception:
+            raise HTTPException(status_code=500, detail="Database query failed")
+        all_rows = [(r[0], r[1], r[2], r[3], r[4], to_image_url(r[5]), "Database") for r in rows]
+        all_rows += [book_tuple(b) for b in seed_books if seed_matches(b, ql, filters)]
+        keys = store_rows(all_rows)
+        books_query_cache.set(cache_key, keys, size=sys.getsizeof(keys) + CACHE_ENTRY_OVERHEAD)
+        page = [row_book(r) for r in all_rows[skip:end]]
+    return page, len(keys)
+
+def projected_search(
+    conn, ql: Optional[str], filters: Dict[str, Any], filter_key: tuple, fields: Tuple[str, ...], skip: int, end: int
+) -> Tuple[List[dict], int]:
+    cache_key = ("books", ql, filter_key, fields)
     cached = books_query_cache.get(cache_key)
     if cached is None:
-        sql = """
-            SELECT id, title, author, publisher, first_publish_year, image_url
-            FROM books
-            WHERE LOWER(title) LIKE %s OR LOWER(author) LIKE %s OR LOWER(publisher) LIKE %s OR CAST(first_publish_year AS TEXT) LIKE %s
-            ORDER BY id
-        """
-        like = f"%{ql}%"
+        name, params = search_statement(False, ql, filters, fields=fields)
         try:
             with conn.cursor() as cursor:
-                cursor.execute(sql, (like, like, like, like))
+                execute_prepared(cursor, name, params)
                 rows = cursor.fetchall()
         except Exception:
             raise HTTPException(status_code=500, detail="Database query failed")
-        db_results = [
-            {
-                "id": r[0],
-                "title": r[1],
-                "author": r[2],
-                "publisher": r[3],
-                "first_publish_year": r[4],
-                "image_url": to_image_url(r[5]),
-                "source": "Database",
-            }
-            for r in rows
+        seed = [tuple(b[f] for f in fields) for b in seed_books if seed_matches(b, ql, filters)]
+        cached = (rows, seed)
+        size = rows_size(rows) + rows_size(seed) + CACHE_ENTRY_OVERHEAD
+        books_query_cache.set(cache_key, cached, size=size)
+    rows, seed = cached
+    n = len(rows)
+    page = rows[skip:end] + seed[max(0, skip - n):max(0, end - n)]
+    return [dict(zip(fields, r)) for r in page], n + len(seed)
+
+@app.get("/suggest")
+def suggest(
+    q: str = Query(..., min_length=1, max_length=100),
+    field: str = Query("all"),
+    limit: int = Query(10, ge=1, le=50),
+):
+    if field not in ("all", "title", "author"):
+        raise HTTPException(status_code=400, detail="field must be one of: all, title, author")
+    prefix = q.strip()
+    results = []
+    if field in ("all", "title"):
+        results += [
+            {"text": text, "field": "title", "book_count": n}
+            for text, n in title_index.suggest(prefix, limit)
         ]
-        ext_results = [
-            b
-            for b in seed_books
-            if ql in (b["title"] or "").lower()
-            or ql in (b["author"] or "").lower()
-            or ql in (b["publisher"] or "").lower()
-            or ql in str(b["first_publish_year"])
+    if field in ("all", "author"):
+        results += [
+            {"text": text, "field": "author", "book_count": n}
+            for text, n in author_index.suggest(prefix, limit)
         ]
-        all_results = db_results + ext_results
-        cached = {"query": q, "results": all_results}
-        books_query_cache.set(cache_key, cached)
-    all_results = cached["results"]
-    total = len(all_results)
-    end = skip + limit
-    return {"query": q, "count": total, "results": all_results[skip:end], "skip": skip, "limit": limit}
+    if field == "all":
+        results.sort(key=lambda x: (-x["book_count"], x["text"].lower()))
+        results = results[:limit]
+    return {"query": q, "results": results}
 
 @app.get("/books/{book_id}")
+@profiled
 def get_book(book_id: int, conn=Depends(get_db)):
     cache_key = ("book", int(book_id))
     cached = book_by_id_cache.get(cache_key)
+    if cached is BOOK_MISSING:
+        raise HTTPException(status_code=404, detail="Book not found")
     if cached is not None:
-        return cached
-    with conn.cursor() as cursor:
-        cursor.execute(
-            "SELECT id, title, author, publisher, first_publish_year, image_url FROM books WHERE id=%s",
-            (book_id,),
-        )
-        row = cursor.fetchone()
+        return row_book(cached)
+    if existing_ids.definitely_missing(book_id):
+        row = None
+    else:
+        with conn.cursor() as cursor:
+            execute_prepared(cursor, "book_by_id", (book_id,))
+            row = cursor.fetchone()
     if not row:
-        for b in seed_books:
-            if b["id"] == book_id:
-                book_by_id_cache.set(cache_key, b)
-                return b
+        seed = seed_by_id.get(book_id)
+        if seed is not None:
+            entry = book_tuple(seed)
+            book_by_id_cache.set(cache_key, entry, size=row_size(entry) + CACHE_ENTRY_OVERHEAD)
+            return seed
+        cache_missing_book(cache_key)
         raise HTTPException(status_code=404, detail="Book not found")
-    out = {
-        "id": row[0],
-        "title": row[1],
-        "author": row[2],
-        "publisher": row[3],
-        "first_publish_year": row[4],
-        "image_url": to_image_url(row[5]),
-        "source": "Database",
-    }
-    book_by_id_cache.set(cache_key, out)
-    return out
+    out = (row[0], row[1], row[2], row[3], row[4], to_image_url(row[5]), "Database")
+    book_by_id_cache.set(cache_key, out, size=row_size(out) + CACHE_ENTRY_OVERHEAD)
+    return row_book(out)
 
 @app.get("/authors")
+@profiled
 def get_authors(q: str = Query(..., min_length=1, max_length=100), conn=Depends(get_db)):
     term = q.strip().lower()
     cache_key = ("authors", term)
     cached = authors_query_cache.get(cache_key)
     if cached is not None:
-        if not cached["results"]:
+        if not cached:
             raise HTTPException(status_code=404, detail="No authors found")
-        return {"query": q, "results": cached["results"]}
+        return {
+            "query": q,
+            "results": [{"author": a, "book_count": n, "source": s} for a, n, s in cached],
+        }
     pattern = f"%{term}%"
     combined = {}
     try:
         with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT author, COUNT(*) AS book_count
-                FROM books
-                WHERE LOWER(author) LIKE %s
-                GROUP BY author
-                """,
-                (pattern,),
-            )
+            execute_prepared(cursor, "authors_search", (pattern,))
             for author, cnt in cursor.fetchall():
                 combined[("Database", author)] = int(cnt)
     except Exception:
@@ -312,39 +2141,47 @@ def get_authors(q: str = Query(..., min_length=1, max_length=100), conn=Depends(
         for (source, author), count in combined.items()
     ]
     results.sort(key=lambda x: (-x["book_count"], x["author"]))
-    authors_query_cache.set(cache_key, {"results": results})
+    entry = tuple((r["author"], r["book_count"], r["source"]) for r in results)
+    size = rows_size(entry) + CACHE_ENTRY_OVERHEAD
+    authors_query_cache.set(cache_key, entry, size=size)
     if not results:
         raise HTTPException(status_code=404, detail="No authors found")
     return {"query": q, "results": results}
 
 @app.post("/books", status_code=201)
+@profiled
 def add_book(
     title: str = Form(..., min_length=3, max_length=100),
     author: str = Form(..., min_length=3, max_length=100),
     publisher: str = Form(..., min_length=3, max_length=100),
     first_publish_year: int = Form(..., ge=0),
     image: Optional[UploadFile] = File(None),
-    conn=Depends(get_db),
+    conn=Depends(get_write_db),
 ):
     image_name = None
     if image:
         image_name = save_upload(image)
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                INSERT INTO books (title, author, publisher, first_publish_year, image_url)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id
-                """,
-                (title, author, publisher, first_publish_year, image_name),
+        if conn is None:
+            new_id = run_batched(
+                lambda cursor: insert_book_row(cursor, title, author, publisher, first_publish_year, image_name)
             )
-            new_id = cursor.fetchone()[0]
-        conn.commit()
+        else:
+            with conn.cursor() as cursor:
+                new_id = insert_book_row(cursor, title, author, publisher, first_publish_year, image_name)
+            conn.commit()
+        existing_ids.add(new_id)
+    except WriteOutcomeUnknown:
+        raise
+    except HTTPException:
+        remove_image(image_name)
+        raise
     except Exception:
-        conn.rollback()
+        if conn is not None:
+            conn.rollback()
         remove_image(image_name)
         raise HTTPException(status_code=500, detail="Failed to add book")
+    suggest_index_add(title, author)
     invalidate_all_reads()
     return {
         "id": new_id,
@@ -357,6 +2194,7 @@ def add_book(
     }
 
 @app.put("/books/{book_id}")
+@profiled
 def update_book(
     book_id: int,
     title: str = Form(..., min_length=3, max_length=100),
@@ -364,58 +2202,87 @@ def update_book(
     publisher: str = Form(..., min_length=3, max_length=100),
     first_publish_year: int = Form(..., ge=0),
     image: Optional[UploadFile] = File(None),
-    conn=Depends(get_db),
+    conn=Depends(get_write_db),
 ):
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT image_url FROM books WHERE id=%s", (book_id,))
-        row = cursor.fetchone()
-    if not row:
-        raise HTTPException(status_code=404, detail="Book not found")
-    old_image = row[0]
-    new_image = old_image
-    if image:
-        new_image = save_upload(image)
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                UPDATE books
-                SET title=%s, author=%s, publisher=%s, first_publish_year=%s, image_url=%s
-                WHERE id=%s
-                RETURNING id
-                """,
-                (title, author, publisher, first_publish_year, new_image, book_id),
+    if conn is None:
+        new_upload = save_upload(image) if image else None
+        try:
+            row = run_batched(
+                lambda cursor: update_book_row(
+                    cursor, book_id, title, author, publisher, first_publish_year, new_upload
+                )
             )
-            updated = cursor.fetchone()
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        if image and new_image != old_image:
-            remove_image(new_image)
-        raise HTTPException(status_code=500, detail="Failed to update book")
+        except WriteOutcomeUnknown:
+            raise
+        except HTTPException:
+            remove_image(new_upload)
+            raise
+        except Exception:
+            remove_image(new_upload)
+            raise HTTPException(status_code=500, detail="Failed to update book")
+        if not row:
+            remove_image(new_upload)
+            raise HTTPException(status_code=404, detail="Book not found")
+        old_image = row[0]
+        new_image = new_upload or old_image
+    else:
+        with conn.cursor() as cursor:
+            execute_prepared(cursor, "book_for_update", (book_id,))
+            row = cursor.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Book not found")
+        old_image = row[0]
+        new_image = old_image
+        if image:
+            new_image = save_upload(image)
+        try:
+            with conn.cursor() as cursor:
+                execute_prepared(
+                    cursor,
+                    "book_update",
+                    (title, author, publisher, first_publish_year, new_image, book_id),
+                )
+                cursor.fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            if image and new_image != old_image:
+                remove_image(new_image)
+            raise HTTPException(status_code=500, detail="Failed to update book")
+    suggest_index_remove(row[1], row[2])
+    suggest_index_add(title, author)
     if image and old_image and new_image != old_image:
         remove_image(old_image)
     invalidate_all_reads()
     return {"status": "updated", "id": book_id, "image_url": to_image_url(new_image)}
 
 @app.delete("/books/{book_id}")
-def delete_book(book_id: int, conn=Depends(get_db)):
+@profiled
+def delete_book(book_id: int, conn=Depends(get_write_db)):
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                "DELETE FROM books WHERE id=%s RETURNING image_url",
-                (book_id,),
-            )
-            row = cursor.fetchone()
+        if conn is None:
+            row = run_batched(lambda cursor: delete_book_row(cursor, book_id))
+        else:
+            with conn.cursor() as cursor:
+                row = delete_book_row(cursor, book_id)
         if not row:
-            conn.rollback()
+            if conn is not None:
+                conn.rollback()
             raise HTTPException(status_code=404, detail="Book not found")
-        conn.commit()
+        if conn is not None:
+            conn.commit()
+        existing_ids.discard(book_id)
     except HTTPException:
         raise
     except Exception:
-        conn.rollback()
+        if conn is not None:
+            conn.rollback()
         raise HTTPException(status_code=500, detail="Failed to delete book")
     remove_image(row[0])
+    suggest_index_remove(row[1], row[2])
     invalidate_all_reads()
-    return {"status": "deleted", "id": book_id}
\ No newline at end of file
+    return {"status": "deleted", "id": book_id}
+
+if SEED_PRELOAD:
+    load_seed()
+    gc.freeze()
\ No newline at end of file
@@ -0,0 +1,65 @@
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Run:  python mock_openlibrary.py [port] [delay_seconds] [fail_every]
+# Then: OPENLIBRARY_URL=http://127.0.0.1:8099/search.json uvicorn main:app
+
+PORT = 8099
+DELAY_SECONDS = 0.0
+FAIL_EVERY = 0
+
+requests_seen = 0
+
+
+def fake_docs(q: str, limit: int):
+    return [
+        {
+            "key": f"/works/OLMOCK{i}W",
+            "title": f"{q.title()} Mock Book {i}",
+            "author_name": [f"Mock Author {i % 7}"],
+            "publisher": [f"Mock Press {i % 3}"],
+            "first_publish_year": 1990 + i,
+        }
+        for i in range(limit)
+    ]
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        global requests_seen
+        requests_seen += 1
+        url = urlparse(self.path)
+        if url.path != "/search.json":
+            self.send_error(404)
+            return
+
+        if DELAY_SECONDS:
+            time.sleep(DELAY_SECONDS)
+        if FAIL_EVERY and requests_seen % FAIL_EVERY == 0:
+            self.send_error(503)
+            return
+
+        qs = parse_qs(url.query)
+        q = (qs.get("q") or [""])[0]
+        limit = int((qs.get("limit") or ["10"])[0])
+        body = json.dumps({"numFound": limit, "docs": fake_docs(q, limit)}).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        PORT = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        DELAY_SECONDS = float(sys.argv[2])
+    if len(sys.argv) > 3:
+        FAIL_EVERY = int(sys.argv[3])
+    print(f"mock OpenLibrary on http://127.0.0.1:{PORT}/search.json (delay={DELAY_SECONDS}s, fail_every={FAIL_EVERY})")
+    ThreadingHTTPServer(("127.0.0.1", PORT), Handler).serve_forever()